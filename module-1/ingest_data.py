@@ -1,35 +1,73 @@
-from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
-import pandas as pd
+import tempfile
+from pathlib import Path
+
+import adbc_driver_postgresql.dbapi
+import httpx
+import pyarrow as pa
+import pyarrow.parquet as pq
 from tqdm.auto import tqdm
 import click
 
+BATCH_SIZE = 100_000
+CHUNK_SIZE = 1 << 20  # 1MB chunks
+
+
+def fetch_to_tempfile(url: str) -> Path:
+    """Download a file over a single streamed request into a temporary file."""
+    with tempfile.NamedTemporaryFile(suffix=Path(url).suffix, delete=False) as f:
+        path = Path(f.name)
+        try:
+            with httpx.Client(http2=True, follow_redirects=True, timeout=300.0) as client:
+                with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_bytes(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+        except BaseException:
+            path.unlink()
+            raise
+    return path
+
+
 def ingest_data(
         url: str,
-        engine: Engine,
+        conn: adbc_driver_postgresql.dbapi.Connection,
         target_table: str,
 ):
-    # Load the entire parquet file into memory
-    print(f"Downloading and loading parquet file from {url}...")
-    df = pd.read_parquet(url)
-    df_count = len(df)
-    print(f"Loaded {df_count} rows into memory.")
-    
-    # Create table and insert all data in one pass
-    print(f"Inserting data into {target_table}...")
-    df.to_sql(name=target_table, con=engine, if_exists="replace")
-
-    # Verify counts
-    query = f"SELECT count(1) FROM {target_table}"
-    db_count = pd.read_sql(query, con=engine).iloc[0, 0]
-
-    print(f"DataFrame row count: {df_count}")
+    # Download the parquet file once, then stream it one record batch at a time
+    print(f"Downloading parquet file from {url}...")
+    local_path = fetch_to_tempfile(url)
+    try:
+        pf = pq.ParquetFile(local_path)
+        file_count = pf.metadata.num_rows
+        print(f"Found {file_count} rows in {pf.num_row_groups} row groups.")
+
+        # Create table and bulk load the Arrow batches with binary COPY
+        print(f"Inserting data into {target_table}...")
+        with tqdm(total=file_count, unit="rows") as progress:
+            def batches():
+                for batch in pf.iter_batches(batch_size=BATCH_SIZE, use_threads=True):
+                    progress.update(batch.num_rows)
+                    yield batch
+
+            reader = pa.RecordBatchReader.from_batches(pf.schema_arrow, batches())
+            with conn.cursor() as cur:
+                cur.adbc_ingest(target_table, reader, mode="replace")
+
+                # Verify counts in the same transaction as the load
+                query = f"SELECT count(1) FROM {target_table}"
+                cur.execute(query)
+                db_count = cur.fetchone()[0]
+        conn.commit()
+    finally:
+        local_path.unlink()
+
+    print(f"Parquet row count: {file_count}")
     print(f"Database row count: {db_count}")
 
-    if df_count == db_count:
+    if file_count == db_count:
         print("Verification successful: Row counts match.")
     else:
-        print(f"Verification failed: Row counts do not match ({df_count} vs {db_count}).")
+        print(f"Verification failed: Row counts do not match ({file_count} vs {db_count}).")
 
     print(f'done ingesting to {target_table}')
 
@@ -42,14 +80,15 @@ def ingest_data(
 @click.option('--pg-db', default='ny_taxi', help='PostgreSQL database name')
 @click.option('--pg-target', default='green_taxi_data', help='Target table name')
 def main(pg_user, pg_pass, pg_host, pg_port, pg_db, pg_target):
-    engine: Engine = create_engine(f'postgresql://{pg_user}:{pg_pass}@{pg_host}:{pg_port}/{pg_db}')
+    uri = f'postgresql://{pg_user}:{pg_pass}@{pg_host}:{pg_port}/{pg_db}'
 
     url = 'https://d37ci6vzurychx.cloudfront.net/trip-data/green_tripdata_2025-11.parquet'
 
-    ingest_data(url=url,
-                engine=engine,
-                target_table=pg_target
-    )
+    with adbc_driver_postgresql.dbapi.connect(uri) as conn:
+        ingest_data(url=url,
+                    conn=conn,
+                    target_table=pg_target
+        )
 
 if __name__ == '__main__':
     main()
@@ -1,8 +1,31 @@
-from sqlalchemy import create_engine
+import csv
+from io import StringIO
+
+from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 import pandas as pd
 import click
 
+
+def psql_insert_copy(table, conn, keys, data_iter):
+    """pandas.to_sql insert method that streams rows through PostgreSQL COPY."""
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        s_buf = StringIO()
+        writer = csv.writer(s_buf)
+        writer.writerows(data_iter)
+        s_buf.seek(0)
+
+        columns = ', '.join(f'"{k}"' for k in keys)
+        if table.schema:
+            table_name = f'{table.schema}.{table.name}'
+        else:
+            table_name = table.name
+
+        sql = f'COPY {table_name} ({columns}) FROM STDIN WITH CSV'
+        cur.copy_expert(sql=sql, file=s_buf)
+
+
 def ingest_data(
         url: str,
         engine: Engine,
@@ -10,17 +33,25 @@ def ingest_data(
 ):
     # Load the entire CSV file into memory
     print(f"Downloading and loading CSV file from {url}...")
-    df = pd.read_csv(url)
+    df = pd.read_csv(url, engine="pyarrow", dtype_backend="pyarrow")
     df_count = len(df)
     print(f"Loaded {df_count} rows into memory.")
     
-    # Create table and insert all data in one pass
-    print(f"Inserting data into {target_table}...")
-    df.to_sql(name=target_table, con=engine, if_exists="replace", index=False)
+    with engine.begin() as conn:
+        # Create table and bulk load the rows with COPY
+        print(f"Inserting data into {target_table}...")
+        df.to_sql(
+            name=target_table,
+            con=conn,
+            if_exists="replace",
+            index=False,
+            method=psql_insert_copy,
+            chunksize=100_000,
+        )
 
-    # Verify counts
-    query = f"SELECT count(1) FROM {target_table}"
-    db_count = pd.read_sql(query, con=engine).iloc[0, 0]
+        # Verify counts in the same transaction as the load
+        query = text(f"SELECT count(1) FROM {target_table}")
+        db_count = conn.execute(query).scalar()
 
     print(f"DataFrame row count: {df_count}")
     print(f"Database row count: {db_count}")
@@ -1,17 +1,32 @@
 """Tests for download_data.py — focused on pure logic and input boundaries."""
 
+import asyncio
+import gzip
 import os
+import threading
 from pathlib import Path
-from unittest.mock import AsyncMock, patch
+from types import MappingProxyType
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import duckdb
+import httpx
 import pytest
 
 from download_data import (
     MAX_CONSECUTIVE_FAILURES,
+    MAX_DOWNLOAD_ATTEMPTS,
+    MAX_IN_FLIGHT,
+    MAX_RANGE_CHUNKS,
+    Downloader,
     build_file_list,
     categorize_files,
+    convert_to_parquet,
     download_all_files,
+    download_file,
+    download_range,
+    download_with_retry,
     get_github_headers,
+    is_retryable,
     load_config,
     parse_args,
     update_gitignore,
@@ -22,30 +37,33 @@ from download_data import (
 # Helpers
 # ---------------------------------------------------------------------------
 
-MINIMAL_CONFIG = {
-    "datasets": [
-        {
-            "taxi_types": ["yellow", "green"],
-            "years": [2019, 2020],
-            "months": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12],
-        },
-    ],
-}
-
-MULTI_GROUP_CONFIG = {
-    "datasets": [
-        {
-            "taxi_types": ["yellow", "green"],
-            "years": [2019, 2020],
-            "months": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12],
-        },
-        {
-            "taxi_types": ["fhv"],
-            "years": [2019],
-            "months": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12],
-        },
-    ],
-}
+# Frozen so no test can leak changes into another through the shared configs
+ALL_MONTHS = tuple(range(1, 13))
+
+MINIMAL_CONFIG = MappingProxyType({
+    "datasets": (
+        MappingProxyType({
+            "taxi_types": ("yellow", "green"),
+            "years": (2019, 2020),
+            "months": ALL_MONTHS,
+        }),
+    ),
+})
+
+MULTI_GROUP_CONFIG = MappingProxyType({
+    "datasets": (
+        MappingProxyType({
+            "taxi_types": ("yellow", "green"),
+            "years": (2019, 2020),
+            "months": ALL_MONTHS,
+        }),
+        MappingProxyType({
+            "taxi_types": ("fhv",),
+            "years": (2019,),
+            "months": ALL_MONTHS,
+        }),
+    ),
+})
 
 
 # ---------------------------------------------------------------------------
@@ -87,6 +105,11 @@ class TestValidateConfig:
         with pytest.raises(SystemExit):
             validate_config(config)
 
+    def test_non_integer_year_in_group(self):
+        config = {"datasets": [{"taxi_types": ["yellow"], "years": ["2019"], "months": [1]}]}
+        with pytest.raises(SystemExit):
+            validate_config(config)
+
     def test_missing_key_in_group(self):
         config = {"datasets": [{"taxi_types": ["yellow"], "years": [2019]}]}
         with pytest.raises(SystemExit):
@@ -182,6 +205,20 @@ class TestLoadConfig:
         with pytest.raises(FileNotFoundError):
             load_config("/nonexistent/config.yml")
 
+    def test_cached_result_is_a_copy(self, tmp_path):
+        config_file = tmp_path / "config.yml"
+        config_file.write_text("datasets:\n  - taxi_types: [yellow]\n")
+        first = load_config(str(config_file))
+        first["datasets"][0]["taxi_types"].append("green")
+        assert load_config(str(config_file)) == {"datasets": [{"taxi_types": ["yellow"]}]}
+
+    def test_reloads_after_file_changes(self, tmp_path):
+        config_file = tmp_path / "config.yml"
+        config_file.write_text("datasets:\n  - taxi_types: [yellow]\n")
+        load_config(str(config_file))
+        config_file.write_text("datasets:\n  - taxi_types: [green, fhv]\n")
+        assert load_config(str(config_file)) == {"datasets": [{"taxi_types": ["green", "fhv"]}]}
+
 
 # ---------------------------------------------------------------------------
 # parse_args
@@ -267,6 +304,17 @@ class TestGetGithubHeaders:
         headers = get_github_headers()
         assert "Authorization" not in headers
 
+    def test_token_change_is_picked_up(self, monkeypatch):
+        monkeypatch.setenv("GITHUB_TOKEN", "ghp_first")
+        get_github_headers()
+        monkeypatch.setenv("GITHUB_TOKEN", "ghp_second")
+        assert get_github_headers()["Authorization"] == "Bearer ghp_second"
+
+    def test_returned_headers_are_a_copy(self, monkeypatch):
+        monkeypatch.setenv("GITHUB_TOKEN", "ghp_test123")
+        get_github_headers()["Authorization"] = "tampered"
+        assert get_github_headers()["Authorization"] == "Bearer ghp_test123"
+
 
 # ---------------------------------------------------------------------------
 # update_gitignore
@@ -295,12 +343,33 @@ class TestUpdateGitignore:
         update_gitignore()
         assert (tmp_path / ".gitignore").read_text() == original
 
+    def test_no_op_when_entry_is_last_line_without_newline(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        original = "*.pyc\r\ndata/"
+        (tmp_path / ".gitignore").write_bytes(original.encode())
+        update_gitignore()
+        assert (tmp_path / ".gitignore").read_bytes() == original.encode()
+
+    def test_appends_when_only_a_nested_data_dir_is_ignored(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / ".gitignore").write_text("raw_data/\n")
+        update_gitignore()
+        assert (tmp_path / ".gitignore").read_text() == "raw_data/\n\n# Data directory\ndata/\n"
+
 
 # ---------------------------------------------------------------------------
 # categorize_files
 # ---------------------------------------------------------------------------
 
 
+def _touch_parquet_files(root: Path, files: list[tuple[str, int, int]]) -> None:
+    """Create empty parquet files for (taxi_type, year, month) tuples under root/data."""
+    for taxi_type in dict.fromkeys(t for t, _, _ in files):
+        (root / "data" / taxi_type).mkdir(parents=True, exist_ok=True)
+    for taxi_type, year, month in files:
+        (root / "data" / taxi_type / f"{taxi_type}_tripdata_{year}-{month:02d}.parquet").touch()
+
+
 class TestCategorizeFiles:
     def test_all_new(self, tmp_path, monkeypatch):
         monkeypatch.chdir(tmp_path)
@@ -312,10 +381,7 @@ class TestCategorizeFiles:
     def test_all_existing(self, tmp_path, monkeypatch):
         monkeypatch.chdir(tmp_path)
         files = [("yellow", 2019, 1), ("green", 2019, 2)]
-        for taxi_type, year, month in files:
-            parquet_dir = tmp_path / "data" / taxi_type
-            parquet_dir.mkdir(parents=True, exist_ok=True)
-            (parquet_dir / f"{taxi_type}_tripdata_{year}-{month:02d}.parquet").touch()
+        _touch_parquet_files(tmp_path, files)
         new, existing = categorize_files(files)
         assert new == []
         assert existing == files
@@ -324,23 +390,291 @@ class TestCategorizeFiles:
         monkeypatch.chdir(tmp_path)
         files = [("yellow", 2019, 1), ("yellow", 2019, 2), ("green", 2019, 1)]
         # Only create the first file on disk
-        parquet_dir = tmp_path / "data" / "yellow"
-        parquet_dir.mkdir(parents=True, exist_ok=True)
-        (parquet_dir / "yellow_tripdata_2019-01.parquet").touch()
+        _touch_parquet_files(tmp_path, files[:1])
         new, existing = categorize_files(files)
         assert existing == [("yellow", 2019, 1)]
         assert new == [("yellow", 2019, 2), ("green", 2019, 1)]
 
+    def test_ignores_non_parquet_files(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        files = [("yellow", 2019, 1)]
+        # A leftover download from an interrupted run doesn't count as existing
+        parquet_dir = tmp_path / "data" / "yellow"
+        parquet_dir.mkdir(parents=True, exist_ok=True)
+        (parquet_dir / "yellow_tripdata_2019-01.csv.gz").touch()
+        new, existing = categorize_files(files)
+        assert new == files
+        assert existing == []
+
+    def test_preserves_input_order_across_types(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        files = [("green", 2019, 1), ("yellow", 2019, 1), ("green", 2019, 2), ("yellow", 2019, 2)]
+        _touch_parquet_files(tmp_path, [("green", 2019, 2), ("yellow", 2019, 2)])
+        new, existing = categorize_files(files)
+        assert new == [("green", 2019, 1), ("yellow", 2019, 1)]
+        assert existing == [("green", 2019, 2), ("yellow", 2019, 2)]
+
+
+# ---------------------------------------------------------------------------
+# convert_to_parquet
+# ---------------------------------------------------------------------------
+
+
+class TestConvertToParquet:
+    CSV = b"VendorID,fare_amount\n" + b"".join(
+        f"{i % 3},{i / 7:.2f}\n".encode() for i in range(5000)
+    )
+
+    @pytest.fixture
+    def duckdb_con(self):
+        with duckdb.connect() as con:
+            yield con
+
+    def test_converts_and_removes_csv_gz(self, tmp_path, duckdb_con):
+        csv_gz_path = tmp_path / "yellow_tripdata_2019-01.csv.gz"
+        csv_gz_path.write_bytes(gzip.compress(self.CSV))
+        parquet_path = tmp_path / "yellow_tripdata_2019-01.parquet"
+
+        convert_to_parquet(duckdb_con, csv_gz_path, parquet_path)
+
+        assert duckdb.sql(f"SELECT count(*) FROM '{parquet_path}'").fetchone() == (5000,)
+        assert not csv_gz_path.exists()
+
+    def test_truncated_gzip_fails_without_parquet(self, tmp_path, duckdb_con):
+        csv_gz_path = tmp_path / "yellow_tripdata_2019-01.csv.gz"
+        compressed = gzip.compress(self.CSV)
+        csv_gz_path.write_bytes(compressed[: len(compressed) // 2])
+        parquet_path = tmp_path / "yellow_tripdata_2019-01.parquet"
+
+        with pytest.raises(EOFError):
+            convert_to_parquet(duckdb_con, csv_gz_path, parquet_path)
+
+        # DuckDB may have read the truncated CSV cleanly; it must not count as converted
+        assert not parquet_path.exists()
+        assert csv_gz_path.exists()
+
+    def test_missing_csv_gz_raises_instead_of_hanging(self, tmp_path):
+        parquet_path = tmp_path / "yellow_tripdata_2019-01.parquet"
+        outcome = []
+
+        def convert():
+            # Its own connection: closing one with a cursor stuck on the pipe would block
+            try:
+                convert_to_parquet(duckdb.connect(), tmp_path / "missing.csv.gz", parquet_path)
+            except Exception as e:
+                outcome.append(e)
+
+        # A daemon thread, so a regression fails the test rather than hanging the run
+        thread = threading.Thread(target=convert, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+
+        assert not thread.is_alive(), "convert_to_parquet blocked on the named pipe"
+        assert len(outcome) == 1 and isinstance(outcome[0], FileNotFoundError)
+        assert not parquet_path.exists()
+
+
+# ---------------------------------------------------------------------------
+# download_file / download_range
+# ---------------------------------------------------------------------------
+
+
+def _file_server(
+    payload: bytes,
+    requests: list[httpx.Request],
+    accept_ranges: bool = True,
+    head_status: int = 200,
+    range_status: int = 206,
+    short_by: int = 0,
+) -> httpx.MockTransport:
+    """Serve payload, answering HEAD and (optionally) Range requests like a release CDN."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        headers = {"accept-ranges": "bytes"} if accept_ranges else {}
+        if request.method == "HEAD":
+            return httpx.Response(
+                head_status, headers={"content-length": str(len(payload)), **headers}
+            )
+        if "range" not in request.headers:
+            return httpx.Response(200, content=payload)
+        start, end = map(int, request.headers["range"].removeprefix("bytes=").split("-"))
+        if range_status == 206:
+            return httpx.Response(
+                206,
+                headers={"content-range": f"bytes {start}-{end}/{len(payload)}"},
+                content=payload[start : end + 1 - short_by],
+            )
+        return httpx.Response(range_status, content=payload)
+
+    return httpx.MockTransport(handler)
+
+
+class TestDownloadFile:
+    @pytest.fixture(autouse=True)
+    def small_ranges(self, monkeypatch):
+        # Split a few KB into several ranges of several chunks each
+        monkeypatch.setattr("download_data.MIN_RANGE_SIZE", 1000)
+        monkeypatch.setattr("download_data.CHUNK_SIZE", 256)
+
+    async def _download(self, transport, dest_path):
+        async with httpx.AsyncClient(transport=transport) as client:
+            await download_file(client, "https://example.com/f.csv.gz", dest_path, MagicMock(), 0)
+
+    async def test_ranges_reassemble_byte_exact(self, tmp_path):
+        payload = os.urandom(10_007)
+        requests = []
+        await self._download(_file_server(payload, requests), tmp_path / "f.csv.gz")
+
+        assert (tmp_path / "f.csv.gz").read_bytes() == payload
+        ranges = sorted(
+            tuple(map(int, r.headers["range"].removeprefix("bytes=").split("-")))
+            for r in requests
+            if r.method == "GET"
+        )
+        assert len(ranges) == MAX_RANGE_CHUNKS
+        # Contiguous and non-overlapping, covering the whole file
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == len(payload) - 1
+        assert all(prev[1] + 1 == cur[0] for prev, cur in zip(ranges, ranges[1:]))
+
+    @pytest.mark.parametrize(
+        "server_kwargs",
+        [{"accept_ranges": False}, {"head_status": 405}],
+        ids=["no-accept-ranges", "head-error"],
+    )
+    async def test_falls_back_to_single_stream(self, tmp_path, server_kwargs):
+        payload = os.urandom(10_007)
+        requests = []
+        transport = _file_server(payload, requests, **server_kwargs)
+        await self._download(transport, tmp_path / "f.csv.gz")
+
+        assert (tmp_path / "f.csv.gz").read_bytes() == payload
+        gets = [r for r in requests if r.method == "GET"]
+        assert len(gets) == 1
+        assert "range" not in gets[0].headers
+
+    async def test_ignored_range_header_falls_back_to_single_stream(self, tmp_path):
+        payload = os.urandom(10_007)
+        requests = []
+        transport = _file_server(payload, requests, range_status=200)
+        await self._download(transport, tmp_path / "f.csv.gz")
+
+        assert (tmp_path / "f.csv.gz").read_bytes() == payload
+        assert "range" not in requests[-1].headers
+
+    async def test_truncated_range_raises_retryable_error(self, tmp_path):
+        transport = _file_server(os.urandom(10_007), [], short_by=100)
+        with pytest.raises(httpx.RemoteProtocolError) as exc_info:
+            await self._download(transport, tmp_path / "f.csv.gz")
+        assert is_retryable(exc_info.value)
+
+    async def test_range_failure_raises_unwrapped_status_error(self, tmp_path):
+        transport = _file_server(os.urandom(10_007), [], range_status=503)
+        with pytest.raises(httpx.HTTPStatusError) as exc_info:
+            await self._download(transport, tmp_path / "f.csv.gz")
+        # Not an ExceptionGroup, so download_with_retry can still classify it
+        assert is_retryable(exc_info.value)
+
+
+class TestDownloadRange:
+    async def test_cancel_waits_for_in_flight_write(self, tmp_path, monkeypatch):
+        started, release = threading.Event(), threading.Event()
+        written = []
+
+        def slow_pwrite_all(fd, data, offset):
+            started.set()
+            release.wait(timeout=5)
+            written.append(offset)
+
+        monkeypatch.setattr("download_data.pwrite_all", slow_pwrite_all)
+        transport = _file_server(b"x" * 10, [])
+        fd = os.open(tmp_path / "file.csv.gz", os.O_WRONLY | os.O_CREAT)
+        try:
+            async with httpx.AsyncClient(transport=transport) as client:
+                task = asyncio.create_task(
+                    download_range(client, "https://example.com/f", fd, 0, 9, MagicMock(), 0)
+                )
+                await asyncio.to_thread(started.wait, 5)
+                task.cancel()
+                asyncio.get_running_loop().call_later(0.05, release.set)
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+        finally:
+            os.close(fd)
+
+        # Cancellation only propagated once the write thread was done with fd
+        assert written == [0]
+
+
+# ---------------------------------------------------------------------------
+# download_with_retry
+# ---------------------------------------------------------------------------
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://example.com/file.csv.gz")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class TestDownloadWithRetry:
+    async def _run(self, side_effect):
+        download_file = AsyncMock(side_effect=side_effect)
+        sleep = AsyncMock()
+        with patch("download_data.download_file", download_file):
+            await download_with_retry(
+                MagicMock(),
+                asyncio.Semaphore(1),
+                "https://example.com/file.csv.gz",
+                Path("file.csv.gz"),
+                MagicMock(),
+                0,
+                sleep=sleep,
+            )
+        return download_file, sleep
+
+    async def test_retries_server_errors(self):
+        download_file, sleep = await self._run([_status_error(503), httpx.ReadTimeout("slow"), None])
+        assert download_file.await_count == 3
+        assert sleep.await_count == 2
+
+    async def test_client_error_not_retried(self):
+        with pytest.raises(httpx.HTTPStatusError):
+            await self._run([_status_error(404)])
+
+    async def test_gives_up_after_max_attempts(self):
+        with pytest.raises(httpx.HTTPStatusError):
+            await self._run([_status_error(503)] * MAX_DOWNLOAD_ATTEMPTS)
+
 
 # ---------------------------------------------------------------------------
 # download_all_files — abort after MAX_CONSECUTIVE_FAILURES
 # ---------------------------------------------------------------------------
 
 
+async def _run_download_all_files(download, files):
+    with patch("download_data.download_and_convert", side_effect=download):
+        with patch("download_data.get_github_headers", return_value={}):
+            return await download_all_files(files)
+
+
+async def _run_downloader(download, files):
+    return await Downloader(download, {}).run(files)
+
+
 class TestDownloadAllFilesAbort:
-    async def test_aborts_after_max_consecutive_failures(self):
-        files = [("yellow", 2019, m) for m in range(1, 13)]
-        assert len(files) > MAX_CONSECUTIVE_FAILURES  # precondition
+    @pytest.mark.parametrize(
+        "run",
+        [_run_download_all_files, _run_downloader],
+        ids=["patched-download_all_files", "injected-Downloader"],
+    )
+    async def test_aborts_after_max_consecutive_failures(self, run):
+        files = [("yellow", year, m) for year in (2019, 2020) for m in range(1, 13)]
+        # Each of the MAX_IN_FLIGHT workers may already be inside a download
+        # when the abort flag is set, but none starts another one after it
+        max_attempts = MAX_CONSECUTIVE_FAILURES + MAX_IN_FLIGHT - 1
+        assert len(files) > max_attempts  # precondition
 
         call_count = 0
 
@@ -349,11 +683,7 @@ class TestDownloadAllFilesAbort:
             call_count += 1
             raise RuntimeError("simulated failure")
 
-        with patch("download_data.download_and_convert", side_effect=fake_download_and_convert):
-            with patch("download_data.get_github_headers", return_value={}):
-                result = await download_all_files(files)
+        result = await run(fake_download_and_convert, files)
 
         assert result == []
-        # With the semaphore, up to CONCURRENT_DOWNLOADS tasks may start
-        # before the abort flag propagates, but we should NOT attempt all 12
-        assert call_count < len(files)
+        assert call_count <= max_attempts